@@ -12,14 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import contextlib
+import numbers
+import os
+from collections import deque
 from contextlib import ExitStack
-from typing import Any, Dict, List, Optional, Tuple, Union
+from functools import lru_cache
+from typing import Any, Deque, Dict, Iterator, List, Literal, Optional, Tuple, Union
 
-import horovod.torch as hvd
 import torch
 import torch.nn as nn
 from lightning_utilities import module_available
 from torch import Tensor
+from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
 from torch.optim import Optimizer
 
 if module_available("lightning"):
@@ -34,7 +38,7 @@ if module_available("lightning"):
     from lightning.pytorch.strategies.parallel import ParallelStrategy
     from lightning.pytorch.strategies.strategy import TBroadcast
     from lightning.pytorch.utilities.exceptions import MisconfigurationException
-    from lightning.pytorch.utilities.rank_zero import rank_zero_only
+    from lightning.pytorch.utilities.rank_zero import WarningCache, rank_zero_only
 elif module_available("pytorch_lightning") and module_available("lightning_fabric"):
     from lightning_fabric.plugins import CheckpointIO
     from lightning_fabric.utilities.distributed import _distributed_available
@@ -47,21 +51,72 @@ elif module_available("pytorch_lightning") and module_available("lightning_fabri
     from pytorch_lightning.strategies.parallel import ParallelStrategy
     from pytorch_lightning.strategies.strategy import TBroadcast
     from pytorch_lightning.utilities.exceptions import MisconfigurationException
-    from pytorch_lightning.utilities.rank_zero import rank_zero_only
+    from pytorch_lightning.utilities.rank_zero import WarningCache, rank_zero_only
 else:
     raise ModuleNotFoundError("You are missing `lightning` or `pytorch-lightning` package, please install it.")
 
-_HOROVOD_NCCL_AVAILABLE = False
+warning_cache = WarningCache()
+
+# small tensors are broadcast packed together into flat buffers of up to this size
+_BROADCAST_BYTES_PER_PACK = 50 * 1024 * 1024
+# upper bound on the memory held by the packs being broadcast at the same time
+_BROADCAST_MAX_BYTES_IN_FLIGHT = 2 * _BROADCAST_BYTES_PER_PACK
+
+
+@lru_cache(1)
+def _horovod_nccl_available() -> bool:
+    # `horovod.torch` is imported lazily as loading it is expensive and not needed until the strategy is used
+    import horovod.torch as hvd
 
-with contextlib.suppress(AttributeError):
-    # `nccl_built` returns an integer
-    _HOROVOD_NCCL_AVAILABLE = bool(hvd.nccl_built())
     # AttributeError can be raised if MPI is not available:
     # https://github.com/horovod/horovod/blob/v0.23.0/horovod/torch/__init__.py#L33-L34
+    with contextlib.suppress(AttributeError):
+        # `nccl_built` returns an integer
+        return bool(hvd.nccl_built())
+    return False
+
+
+def __getattr__(name: str) -> Any:
+    # keep `_HOROVOD_NCCL_AVAILABLE` importable without probing Horovod at import time
+    if name == "_HOROVOD_NCCL_AVAILABLE":
+        return _horovod_nccl_available()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _tensor_nbytes(tensor: Tensor) -> int:
+    return tensor.numel() * tensor.element_size()
+
+
+def _split_into_packs(tensors: List[Tensor], bytes_per_pack: int) -> Iterator[List[Tensor]]:
+    pack: List[Tensor] = []
+    pack_bytes = 0
+    for tensor in tensors:
+        nbytes = _tensor_nbytes(tensor)
+        if pack and pack_bytes + nbytes > bytes_per_pack:
+            yield pack
+            pack, pack_bytes = [], 0
+        pack.append(tensor)
+        pack_bytes += nbytes
+    if pack:
+        yield pack
+
+
+def _copy_unflattened(flat: Tensor, tensors: List[Tensor]) -> None:
+    """Copy the content of a buffer created with ``_flatten_dense_tensors(tensors)`` back into the tensors."""
+    for tensor, synced in zip(tensors, _unflatten_dense_tensors(flat, tensors)):
+        tensor.copy_(synced)
 
 
 class HorovodStrategy(ParallelStrategy):
-    """Plugin for Horovod distributed training integration."""
+    """Plugin for Horovod distributed training integration.
+
+    Elastic Horovod is not supported: the ranks and the world size are read when the strategy is created and set up,
+    and are not updated if the set of workers changes while training.
+
+    Args:
+        gradient_compression: compression applied to the gradients before the allreduce. ``"fp16"`` halves the
+            bytes sent over the network, at the cost of the fp16 range and precision for the reduced gradients.
+    """
 
     strategy_name = "horovod"
     optimizers: List[Optimizer]
@@ -72,8 +127,14 @@ class HorovodStrategy(ParallelStrategy):
         parallel_devices: Optional[List[torch.device]] = None,
         checkpoint_io: Optional[CheckpointIO] = None,
         precision_plugin: Optional[PrecisionPlugin] = None,
+        gradient_compression: Literal["none", "fp16"] = "none",
     ):
+        import horovod.torch as hvd
+
+        if gradient_compression not in ("none", "fp16"):
+            raise ValueError(f"unrecognized `gradient_compression`: {gradient_compression}")
         hvd.init()
+        self._set_world_ranks()
         super().__init__(
             accelerator=accelerator,
             parallel_devices=parallel_devices,
@@ -81,20 +142,21 @@ class HorovodStrategy(ParallelStrategy):
             checkpoint_io=checkpoint_io,
             precision_plugin=precision_plugin,
         )
-        rank_zero_only.rank = self.global_rank
+        self._gradient_compression = gradient_compression
+        self._scalar_buffer: Optional[Tensor] = None
         self._exit_stack: Optional[ExitStack] = None
 
     @property
     def global_rank(self) -> int:
-        return hvd.rank()
+        return self._global_rank
 
     @property
     def local_rank(self) -> int:
-        return hvd.local_rank()
+        return self._local_rank
 
     @property
     def world_size(self) -> int:
-        return hvd.size()
+        return self._world_size
 
     @property
     def root_device(self) -> torch.device:
@@ -108,16 +170,33 @@ class HorovodStrategy(ParallelStrategy):
     @property
     def handles_gradient_accumulation(self) -> bool:
         """Whether the plugin handles gradient accumulation internally."""
-        return True
+        # Lightning skips the optimizer step within an accumulation window, so the steps, the schedulers and
+        # `global_step` follow the same cadence as with the other strategies
+        return False
 
     def setup(self, trainer: Trainer) -> None:
+        import horovod.torch as hvd
+
+        # Horovod may have been re-initialized between two runs of the trainer
+        self._set_world_ranks()
+        if self.root_device.type == "cuda" and not _horovod_nccl_available():
+            warning_cache.warn(
+                "Horovod was built without NCCL support, so the collectives for CUDA tensors will be staged through"
+                " the host. Reinstall it with `HOROVOD_GPU_OPERATIONS=NCCL pip install --no-cache-dir horovod`."
+            )
+        if (
+            self.root_device.type == "cuda"
+            and self.world_size > hvd.local_size()
+            and "HOROVOD_HIERARCHICAL_ALLREDUCE" not in os.environ
+        ):
+            warning_cache.info(
+                "Running Horovod across multiple nodes. Consider setting `HOROVOD_HIERARCHICAL_ALLREDUCE=1` to reduce"
+                " within each node first and only exchange the partial results between the nodes."
+            )
         self.model_to_device()
 
         super().setup(trainer)
 
-        self._exit_stack = ExitStack()
-        self._exit_stack.__enter__()
-
         if not trainer.training:
             # no need to setup optimizers
             return
@@ -128,36 +207,118 @@ class HorovodStrategy(ParallelStrategy):
         optimizers = self.optimizers
         optimizers = [_unpack_lightning_optimizer(opt) for opt in optimizers]
 
+        world_size = self.world_size
         # Horovod: scale the learning rate by the number of workers to account for
         # increased total batch size
         for optimizer in optimizers:
             for param_group in optimizer.param_groups:
-                param_group["lr"] *= self.world_size
+                param_group["lr"] *= world_size
 
         # Horovod: adjust base LR used by schedulers to match scaled optimizer initial LR
-        lr_scheduler_configs = self.lr_scheduler_configs
-        for config in lr_scheduler_configs:
+        for config in self.lr_scheduler_configs:
             scheduler = config.scheduler
-            if hasattr(scheduler, "base_lrs"):
-                scheduler.base_lrs = [lr * self.world_size for lr in scheduler.base_lrs]
+            if hasattr(scheduler, "base_lrs") and not isinstance(scheduler.base_lrs, Tensor):
+                scheduler.base_lrs = [lr * world_size for lr in scheduler.base_lrs]
 
         assert self.lightning_module is not None
-        # Horovod: broadcast parameters & optimizer state to ensure consistent initialization
-        hvd.broadcast_parameters(self.lightning_module.state_dict(), root_rank=0)
-        for optimizer in optimizers:
-            hvd.broadcast_optimizer_state(optimizer, root_rank=0)
+        if self._world_size > 1:
+            # Horovod: broadcast parameters & optimizer state to ensure consistent initialization
+            self._synchronize_broadcasts(self._broadcast_parameters_async(self.lightning_module.state_dict()))
+            for optimizer in optimizers:
+                hvd.broadcast_optimizer_state(optimizer, root_rank=0)
 
         self.optimizers = self._wrap_optimizers(optimizers, trainer.accumulate_grad_batches)
-        for optimizer in self.optimizers:
-            # Synchronization will be performed explicitly following backward()
-            self._exit_stack.enter_context(optimizer.skip_synchronize())
+        if self.optimizers:
+            self._exit_stack = ExitStack()
+            self._exit_stack.__enter__()
+            for optimizer in self.optimizers:
+                # Synchronization will be performed explicitly following backward()
+                self._exit_stack.enter_context(optimizer.skip_synchronize())
+
+    def _set_world_ranks(self) -> None:
+        """Snapshot the process topology, so the rank properties don't call into Horovod on every access."""
+        import horovod.torch as hvd
+
+        self._global_rank = hvd.rank()
+        self._local_rank = hvd.local_rank()
+        self._world_size = hvd.size()
+        rank_zero_only.rank = self._global_rank
+
+    @staticmethod
+    def _broadcast_parameters_async(
+        state_dict: Dict[str, Any], root_rank: int = 0
+    ) -> List[Tuple[int, Tensor, List[Tensor]]]:
+        """Enqueue the broadcast of the tensors of a state dict.
+
+        Tensors smaller than ``_BROADCAST_BYTES_PER_PACK`` are packed per dtype and device into flat buffers, so that
+        a model with many small parameters does not pay the latency of one collective per tensor. Larger tensors are
+        broadcast in-place. The oldest packs are completed as soon as the packs in flight exceed
+        ``_BROADCAST_MAX_BYTES_IN_FLIGHT``, which bounds the extra memory. The returned broadcasts are completed by
+        :meth:`_synchronize_broadcasts`.
+        """
+        import horovod.torch as hvd
+
+        broadcasts: List[Tuple[int, Tensor, List[Tensor]]] = []
+        small_tensors: Dict[Tuple[torch.dtype, torch.device], List[Tensor]] = {}
+        for name, tensor in sorted(state_dict.items()):
+            if not isinstance(tensor, Tensor):
+                continue
+            if _tensor_nbytes(tensor) >= _BROADCAST_BYTES_PER_PACK:
+                broadcasts.append((hvd.broadcast_async_(tensor, root_rank=root_rank, name=name), tensor, []))
+            else:
+                small_tensors.setdefault((tensor.dtype, tensor.device), []).append(tensor)
+
+        packs = (
+            pack for tensors in small_tensors.values() for pack in _split_into_packs(tensors, _BROADCAST_BYTES_PER_PACK)
+        )
+        packed: Deque[Tuple[int, Tensor, List[Tensor]]] = deque()
+        bytes_in_flight = 0
+        for idx, pack in enumerate(packs):
+            flat = _flatten_dense_tensors(pack)
+            handle = hvd.broadcast_async_(flat, root_rank=root_rank, name=f"HorovodStrategy.broadcast_pack.{idx}")
+            packed.append((handle, flat, pack))
+            bytes_in_flight += _tensor_nbytes(flat)
+            while bytes_in_flight > _BROADCAST_MAX_BYTES_IN_FLIGHT:
+                oldest = packed.popleft()
+                HorovodStrategy._synchronize_broadcasts([oldest])
+                bytes_in_flight -= _tensor_nbytes(oldest[1])
+        return broadcasts + list(packed)
+
+    @staticmethod
+    def _synchronize_broadcasts(broadcasts: List[Tuple[int, Tensor, List[Tensor]]]) -> None:
+        """Wait for the broadcasts enqueued by :meth:`_broadcast_parameters_async` and unpack the packed tensors."""
+        import horovod.torch as hvd
+
+        for handle, flat, pack in broadcasts:
+            hvd.synchronize(handle)
+            _copy_unflattened(flat, pack)
 
     def barrier(self, *args: Any, **kwargs: Any) -> None:
         if _distributed_available():
             self.join()
 
     def broadcast(self, obj: TBroadcast, src: int = 0) -> TBroadcast:
-        return hvd.broadcast_object(obj, src)
+        import cloudpickle
+        import horovod.torch as hvd
+
+        if self._world_size == 1:
+            return obj
+        if self.root_device.type != "cuda" or not _horovod_nccl_available():
+            return hvd.broadcast_object(obj, src)
+
+        # serialize once on the source rank and broadcast the payload as a CUDA tensor, so that it goes through NCCL
+        # instead of the host-side MPI broadcast used by `hvd.broadcast_object`
+        payload = cloudpickle.dumps(obj) if self.global_rank == src else b""
+        size = torch.tensor([len(payload)], dtype=torch.int64, device=self.root_device)
+        hvd.broadcast_(size, root_rank=src, name="HorovodStrategy.broadcast.size")
+        if self.global_rank == src:
+            buffer = torch.frombuffer(bytearray(payload), dtype=torch.uint8).to(self.root_device)
+            hvd.broadcast_(buffer, root_rank=src, name="HorovodStrategy.broadcast.payload")
+            # like `hvd.broadcast_object`, the source rank keeps its own object
+            return obj
+        buffer = torch.empty(int(size.item()), dtype=torch.uint8, device=self.root_device)
+        hvd.broadcast_(buffer, root_rank=src, name="HorovodStrategy.broadcast.payload")
+        return cloudpickle.loads(buffer.cpu().numpy().tobytes())
 
     def model_to_device(self) -> None:
         if self.root_device.type == "cuda":
@@ -167,6 +328,11 @@ class HorovodStrategy(ParallelStrategy):
         self.model.to(self.root_device)
 
     def join(self) -> None:
+        import horovod.torch as hvd
+
+        if self._world_size == 1:
+            # nothing to wait for
+            return
         if self.root_device.type == "cuda":
             hvd.join(self.local_rank)
         else:
@@ -187,8 +353,12 @@ class HorovodStrategy(ParallelStrategy):
                 Can also be a string 'sum' to calculate the sum during reduction.
 
         Return:
-            reduced value, except when the input was not a tensor the output remains is unchanged
+            reduced value, Python numbers are returned as Python numbers while other non-tensor inputs are converted to
+            a tensor on the root device before the reduction. On CUDA runs, tensors are moved to the root device, so a
+            CPU tensor is returned as a new tensor on the CUDA device
         """
+        import horovod.torch as hvd
+
         if group is not None:
             raise ValueError("Horovod does not support allreduce using a subcommunicator at this time. Unset `group`.")
 
@@ -199,11 +369,33 @@ class HorovodStrategy(ParallelStrategy):
         else:
             raise ValueError(f"unrecognized `reduce_op`: {reduce_op}")
 
-        # sync all processes before reduction
-        self.join()
+        if isinstance(tensor, numbers.Real):
+            return self._reduce_scalar(tensor, reduce_op)
+
+        tensor = self._to_collective_tensor(tensor)
+        # the allreduce is a collective, so there is no need to sync all processes with `join` beforehand
+        if tensor.is_floating_point():
+            # reduce in-place like DDP does, which saves allocating the output buffer
+            return hvd.allreduce_(tensor, op=reduce_op)
         return hvd.allreduce(tensor, op=reduce_op)
 
+    def _reduce_scalar(self, value: numbers.Real, reduce_op: Any) -> Union[int, float]:
+        """Reduce a Python number through a reusable one-element buffer on the root device."""
+        import horovod.torch as hvd
+
+        if self._scalar_buffer is None or self._scalar_buffer.device != self.root_device:
+            # float64 represents integers exactly up to 2**53
+            self._scalar_buffer = torch.empty(1, dtype=torch.float64, device=self.root_device)
+        self._scalar_buffer.fill_(float(value))
+        reduced = hvd.allreduce_(self._scalar_buffer, op=reduce_op).item()
+        if isinstance(value, numbers.Integral) and reduce_op == hvd.Sum:
+            return int(reduced)
+        return reduced
+
     def all_gather(self, result: Tensor, group: Optional[Any] = dist_group.WORLD, sync_grads: bool = False) -> Tensor:
+        """Gathers the tensor from all processes, on CUDA runs the result is on the root device even for CPU inputs."""
+        import horovod.torch as hvd
+
         if group is not None and group != dist_group.WORLD:
             raise ValueError("Horovod does not support allgather using a subcommunicator at this time. Unset `group`.")
 
@@ -211,35 +403,75 @@ class HorovodStrategy(ParallelStrategy):
             # Convert scalars to single dimension tensors
             result = result.reshape(1)
 
-        # sync and gather all
-        self.join()
+        result = self._to_collective_tensor(result)
+        # Horovod allocates the output itself, its size is only known once all ranks reported their first dimension.
+        # The result is handed over to the caller, so it cannot be recycled between calls anyway
         return hvd.allgather(result)
 
+    def _to_collective_tensor(self, tensor: Union[Any, Tensor]) -> Tensor:
+        """Place the tensor where Horovod dispatches the collective to NCCL instead of the MPI fallback."""
+        if not isinstance(tensor, Tensor):
+            tensor = torch.tensor(tensor, device=self.root_device)
+        elif self.root_device.type == "cuda":
+            tensor = tensor.to(self.root_device)
+        return tensor.contiguous()
+
     def post_backward(self, closure_loss: Tensor) -> None:
+        assert self.lightning_module is not None
+        if self.lightning_module.trainer.fit_loop._should_accumulate():
+            # Horovod launches the gradient allreduce itself once `backward_passes_per_step` is reached. Calling
+            # `synchronize()` within an accumulation window would force an allreduce of every gradient which has not
+            # been reduced yet and reset the `backward_passes_per_step` delay
+            return
+        # put all the allreduce calls in flight before waiting on any of them, otherwise `synchronize()` would only
+        # launch the missing ones of an optimizer after the previous optimizers completed
+        for optimizer in self.optimizers:
+            self._enqueue_missing_allreduces(optimizer)
         # synchronize all horovod optimizers.
         for optimizer in self.optimizers:
             optimizer.synchronize()
 
-    def _wrap_optimizers(
-        self, optimizers: List[Optimizer], accumulate_grad_batches: int
-    ) -> List["hvd.DistributedOptimizer"]:
+    @staticmethod
+    def _enqueue_missing_allreduces(optimizer: Optimizer) -> None:
+        """Launch the allreduce of the gradients whose hooks did not launch one, as ``synchronize()`` would do."""
+        # this relies on Horovod's internals, leave it all to `synchronize()` if they are not what we expect
+        handles = getattr(optimizer, "_handles", None)
+        requires_update = getattr(optimizer, "_requires_update", None)
+        if not isinstance(handles, dict) or not isinstance(requires_update, set) or getattr(optimizer, "_groups", None):
+            return
+        for p in requires_update:
+            # the hooks store `(None, None)` while the `backward_passes_per_step` delay has not run out
+            if p not in handles or handles[p][0] is None:
+                handles[p] = optimizer._allreduce_grad_async(p)
+
+    def _wrap_optimizers(self, optimizers: List[Optimizer], accumulate_grad_batches: int) -> List[Optimizer]:
         """Wrap optimizers to perform gradient aggregation via allreduce."""
+        import horovod.torch as hvd
+
         assert self.lightning_module is not None
         return [
             hvd.DistributedOptimizer(
                 opt,
                 backward_passes_per_step=accumulate_grad_batches,
                 named_parameters=self._filter_named_parameters(self.lightning_module, opt),
+                compression=getattr(hvd.Compression, self._gradient_compression),
             )
-            if "horovod" not in str(opt.__class__)
+            if not self._is_horovod_optimizer(opt)
             else opt
             for opt in optimizers
         ]
 
+    @staticmethod
+    def _is_horovod_optimizer(optimizer: Optimizer) -> bool:
+        # `hvd.DistributedOptimizer` creates a new class deriving from the optimizer's own class with Horovod's methods
+        # copied over, so there is no Horovod type to check against with `isinstance`
+        return callable(getattr(optimizer, "skip_synchronize", None))
+
     @staticmethod
     def _filter_named_parameters(model: nn.Module, optimizer: Optimizer) -> List[Tuple[str, nn.Parameter]]:
-        opt_params = {p for group in optimizer.param_groups for p in group.get("params", [])}
-        return [(name, p) for name, p in model.named_parameters() if p in opt_params]
+        # compare by identity to avoid hashing the tensors themselves
+        opt_param_ids = {id(p) for group in optimizer.param_groups for p in group.get("params", [])}
+        return [(name, p) for name, p in model.named_parameters() if id(p) in opt_param_ids]
 
     @classmethod
     def register_strategies(cls, strategy_registry: Dict) -> None:
@@ -255,6 +487,6 @@ class HorovodStrategy(ParallelStrategy):
         if self._exit_stack:
             self._exit_stack.__exit__(None, None, None)
             self._exit_stack = None
-        # Make sure all workers have finished training before returning to the user
+        # Make sure all workers have finished training before returning to the user, a no-op for a single worker
         self.join()
         super().teardown()
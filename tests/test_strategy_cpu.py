@@ -32,7 +32,7 @@ else:
     raise ModuleNotFoundError("You are missing `lightning` or `pytorch-lightning` package, please install it.")
 
 
-from lightning_horovod.strategy import HorovodStrategy
+from lightning_horovod.strategy import HorovodStrategy, _copy_unflattened, _split_into_packs
 from tests.helpers import BasicGAN, _run_horovod
 
 
@@ -61,6 +61,68 @@ def test_accumulate_grad_batches(tmpdir):
     _run_horovod(trainer_options)
 
 
+def test_accumulate_grad_batches_over_epoch_end(tmpdir):
+    """Test that the last batch of an epoch closes an incomplete accumulation window."""
+    trainer_options = {
+        "default_root_dir": str(tmpdir),
+        "enable_progress_bar": False,
+        "max_epochs": 2,
+        "limit_train_batches": 5,
+        "limit_val_batches": 0,
+        "accumulate_grad_batches": 2,
+    }
+    _run_horovod(trainer_options)
+
+
+def test_accumulate_grad_batches_weights_in_sync(tmpdir):
+    """Test that the weights only change at the end of an accumulation window, in sync and counted as a step."""
+
+    def hvd_test_fn():
+        accumulate_grad_batches = 2
+        limit_train_batches = 5
+
+        class TestModel(BoringModel):
+            def on_train_start(self):
+                self.last_weights = self._flat_weights()
+
+            def on_train_batch_end(self, outputs, batch, batch_idx):
+                weights = self._flat_weights()
+                closes_window = (batch_idx + 1) % accumulate_grad_batches == 0 or batch_idx + 1 == limit_train_batches
+                if not closes_window:
+                    assert torch.equal(weights, self.last_weights), f"weights updated within a window at {batch_idx}"
+                gathered = hvd.allgather(weights.unsqueeze(0))
+                assert torch.equal(gathered[0], gathered[1]), f"weights differ across ranks at {batch_idx}"
+                self.last_weights = weights
+
+            def _flat_weights(self):
+                return torch.cat([p.detach().flatten() for p in self.parameters()]).clone()
+
+            def configure_optimizers(self):
+                optimizer = torch.optim.SGD(self.layer.parameters(), lr=0.1)
+                lr_scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=1)
+                return [optimizer], [{"scheduler": lr_scheduler, "interval": "step"}]
+
+        trainer = Trainer(
+            default_root_dir=tmpdir,
+            max_epochs=2,
+            limit_train_batches=limit_train_batches,
+            limit_val_batches=0,
+            accumulate_grad_batches=accumulate_grad_batches,
+            enable_progress_bar=False,
+            enable_model_summary=False,
+            enable_checkpointing=False,
+            logger=False,
+            strategy=HorovodStrategy(),
+        )
+        trainer.fit(TestModel())
+        # the last batch of each epoch closes a partial window, and its step is counted like any other
+        num_steps = 2 * -(-limit_train_batches // accumulate_grad_batches)
+        assert trainer.global_step == num_steps
+        assert trainer.lr_scheduler_configs[0].scheduler.last_epoch == num_steps
+
+    horovod.run(hvd_test_fn, np=2)
+
+
 def test_clip_grad_by_value(tmpdir):
     """Test Horovod running multi-process on CPU."""
     trainer_options = {
@@ -88,6 +150,83 @@ def test_implicit(tmpdir):
     _run_horovod(trainer_options)
 
 
+def test_split_into_packs():
+    tensors = [torch.zeros(4), torch.zeros(2), torch.zeros(3), torch.zeros(10), torch.zeros(1)]
+    packs = list(_split_into_packs(tensors, bytes_per_pack=6 * 4))
+    assert [[t.numel() for t in pack] for pack in packs] == [[4, 2], [3], [10], [1]]
+    # every tensor lands in exactly one pack, in order
+    assert [t for pack in packs for t in pack] == tensors
+    assert list(_split_into_packs([], bytes_per_pack=1)) == []
+
+
+def test_copy_unflattened():
+    tensors = [torch.rand(2, 3), torch.rand(4), torch.rand(()), torch.rand(3, 2).t()]
+    expected = [t + 1 for t in tensors]
+    flat = torch._utils._flatten_dense_tensors(tensors)
+    assert flat.numel() == sum(t.numel() for t in tensors)
+
+    flat += 1
+    _copy_unflattened(flat, tensors)
+    for tensor, exp in zip(tensors, expected):
+        assert torch.equal(tensor, exp)
+
+
+@pytest.mark.parametrize(
+    ("gradient_compression", "expected"), [("none", hvd.Compression.none), ("fp16", hvd.Compression.fp16)]
+)
+def test_gradient_compression(gradient_compression, expected):
+    model = BoringModel()
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    strategy = HorovodStrategy(gradient_compression=gradient_compression)
+    strategy.connect(model)
+
+    with patch("horovod.torch.DistributedOptimizer") as distributed_optimizer_mock:
+        strategy._wrap_optimizers([optimizer], accumulate_grad_batches=1)
+    distributed_optimizer_mock.assert_called_once()
+    assert distributed_optimizer_mock.call_args.kwargs["compression"] is expected
+
+
+def test_gradient_compression_unrecognized():
+    with pytest.raises(ValueError, match="unrecognized `gradient_compression`"):
+        HorovodStrategy(gradient_compression="int8")
+
+
+@pytest.mark.parametrize(
+    ("value", "reduce_op", "expected"),
+    [(3, "mean", 3.0), (3, "sum", 3), (2.5, "mean", 2.5), (2.5, "sum", 2.5)],
+)
+def test_reduce_python_number(value, reduce_op, expected):
+    strategy = HorovodStrategy(parallel_devices=[torch.device("cpu")])
+    reduced = strategy.reduce(value, reduce_op=reduce_op)
+    assert type(reduced) is type(expected)
+    assert reduced == expected
+
+
+def test_reduce_tensor_in_place():
+    strategy = HorovodStrategy(parallel_devices=[torch.device("cpu")])
+    tensor = torch.tensor([1.0, 2.0])
+    reduced = strategy.reduce(tensor, reduce_op="sum")
+    assert reduced is tensor
+    assert torch.equal(reduced, torch.tensor([1.0, 2.0]) * strategy.world_size)
+
+
+def test_enqueue_missing_allreduces():
+    """Test that the allreduces not launched by the hooks are enqueued, like ``synchronize()`` would do."""
+    hvd.init()
+    launched, delayed, missing = (torch.nn.Parameter(torch.zeros(1)) for _ in range(3))
+    optimizer = hvd.DistributedOptimizer(
+        torch.optim.SGD([launched, delayed, missing], lr=0.1),
+        named_parameters=[("launched", launched), ("delayed", delayed), ("missing", missing)],
+    )
+    # `(None, None)` is what the hooks store while the `backward_passes_per_step` delay has not run out
+    optimizer._handles = {launched: ("handle", None), delayed: (None, None)}
+    with patch.object(optimizer, "_allreduce_grad_async", side_effect=lambda p: ("new handle", None)) as mock:
+        HorovodStrategy._enqueue_missing_allreduces(optimizer)
+    assert {call.args[0] for call in mock.call_args_list} == {delayed, missing}
+    assert optimizer._handles[launched] == ("handle", None)
+    assert optimizer._handles[delayed] == optimizer._handles[missing] == ("new handle", None)
+
+
 @pytest.mark.xfail(
     raises=RuntimeError, reason="Training with multiple optimizers is only supported with manual optimization"
 )